@@ -10,10 +10,15 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import dspy
 import json
+from dspy.evaluate import Evaluate
 from src.improved_evaluator import ImprovedCodeReviewEvaluator, create_improved_metric
-from src.utils import read_code_file, save_json
+from src.utils import read_code_file, save_json, compute_cache_key
+from src.trim import truncate_to_tokens
 from datetime import datetime
 
+MODEL = "ollama/qwen3"
+MAX_CODE_TOKENS = 400  # Keep prompts small for the local model
+
 print("=" * 70)
 print("REAL DSPy OPTIMIZATION WITH QWEN")
 print("=" * 70)
@@ -27,7 +32,13 @@ print()
 # Configure Qwen
 print("🔧 Configuring Ollama + Qwen...")
 try:
-    lm = dspy.LM('ollama/qwen3', api_base='http://localhost:11434', temperature=0.3)
+    # Cache completions on disk so re-runs replay identical requests locally
+    dspy.configure_cache(
+        enable_disk_cache=True,
+        enable_memory_cache=True,
+        disk_cache_dir=".dspy_cache"
+    )
+    lm = dspy.LM(MODEL, api_base='http://localhost:11434', temperature=0.3, cache=True)
     dspy.configure(lm=lm)
     print("✅ Connected to Qwen")
 except Exception as e:
@@ -47,7 +58,7 @@ trainset = []
 for case in training_data["training_cases"][:3]:
     code = read_code_file(case["file_path"])
     example = dspy.Example(
-        code=code[:1500],
+        code=truncate_to_tokens(code, MAX_CODE_TOKENS),
         language=case["language"],
         expected_critical_count=case["severity_distribution"]["Critical"],
         expected_high_count=case["severity_distribution"]["High"],
@@ -59,10 +70,12 @@ print(f"✅ Loaded {len(trainset)} examples")
 print()
 
 # Define signature
+# Inputs are ordered from most to least shared so the rendered prompt keeps
+# the longest possible common prefix (for provider-side prompt caching)
 class CodeReview(dspy.Signature):
     """Find security vulnerabilities and bugs in code."""
-    code = dspy.InputField(desc="Source code to analyze")
     language = dspy.InputField(desc="Programming language")
+    code = dspy.InputField(desc="Source code to analyze")
     critical_issues = dspy.OutputField(desc="Critical security vulnerabilities")
     high_issues = dspy.OutputField(desc="High priority bugs")
 
@@ -70,6 +83,31 @@ class CodeReview(dspy.Signature):
 evaluator = ImprovedCodeReviewEvaluator()
 metric = create_improved_metric(evaluator)
 
+
+# Evaluate runs the examples on a thread pool and scores failures as 0.0.
+# dspy cancels the pass once error_count >= max_errors, so allow one more
+# error than there are examples: even if every call fails (e.g. Ollama is
+# down) the pass finishes with zero scores instead of raising
+evaluate = Evaluate(
+    devset=trainset,
+    metric=metric,
+    num_threads=8,
+    display_progress=True,
+    return_all_scores=True,
+    max_errors=len(trainset) + 1
+)
+
+
+def score_program(program):
+    """Score a program on the training set and print per-example results."""
+    _, scores = evaluate(program)
+
+    for i, score in enumerate(scores):
+        print(f"Testing {i+1}/{len(scores)}... {score:.1%}")
+
+    return scores
+
+
 # Baseline
 print("=" * 70)
 print("STEP 1: BASELINE (No optimization)")
@@ -77,18 +115,7 @@ print("=" * 70)
 print()
 
 baseline = dspy.Predict(CodeReview)
-baseline_scores = []
-
-for i, example in enumerate(trainset):
-    print(f"Testing {i+1}/{len(trainset)}...", end=" ")
-    try:
-        pred = baseline(code=example.code, language=example.language)
-        score = metric(example, pred)
-        baseline_scores.append(score)
-        print(f"{score:.1%}")
-    except Exception as e:
-        print(f"Error: {e}")
-        baseline_scores.append(0.0)
+baseline_scores = score_program(baseline)
 
 baseline_avg = sum(baseline_scores) / len(baseline_scores) if baseline_scores else 0
 print(f"\n✅ Baseline: {baseline_avg:.1%}\n")
@@ -109,18 +136,51 @@ print()
 # Create module
 module = dspy.ChainOfThought(CodeReview)
 
+# One demo of each kind: extra demos inflate every later prompt and don't
+# reliably help. Rollouts scoring under the threshold are rejected as demos.
+optimizer_config = {
+    "max_bootstrapped_demos": 1,
+    "max_labeled_demos": 1,
+    "max_rounds": 1,
+    "metric_threshold": 0.5
+}
+
+# Only the teacher samples at high temperature; evaluation calls keep the
+# configured temperature so they stay cache-hittable
+teacher_temperature = 1.0
+
+# Compiled programs are keyed on everything that affects the result, so an
+# unchanged rerun reloads the saved demos instead of re-optimizing
+cache_key = compute_cache_key(
+    MODEL,
+    repr(CodeReview),
+    [example.toDict() for example in trainset],
+    optimizer_config,
+    teacher_temperature
+)
+compiled_path = Path("results") / f"compiled_{cache_key[:16]}.json"
+
 # Run REAL optimization
 try:
-    optimizer = dspy.BootstrapFewShot(
-        metric=metric,
-        max_bootstrapped_demos=2,  # Keep it small for speed
-        max_labeled_demos=2,
-        max_rounds=1
-    )
+    if compiled_path.exists():
+        print(f"♻️  Loading compiled program from {compiled_path}")
+        module.load(str(compiled_path))
+        optimized = module
+        print("✅ Loaded cached optimization!\n")
+    else:
+        optimizer = dspy.BootstrapFewShot(
+            metric=metric,
+            teacher_settings={"lm": lm.copy(temperature=teacher_temperature)},
+            **optimizer_config
+        )
+
+        print("🔄 Running optimization...")
+        optimized = optimizer.compile(module, trainset=trainset)
+        print("✅ Optimization complete!\n")
 
-    print("🔄 Running optimization...")
-    optimized = optimizer.compile(module, trainset=trainset)
-    print("✅ Optimization complete!\n")
+        compiled_path.parent.mkdir(parents=True, exist_ok=True)
+        optimized.save(str(compiled_path))
+        print(f"💾 Compiled program saved to {compiled_path}\n")
 
 except Exception as e:
     print(f"❌ Optimization failed: {e}")
@@ -137,17 +197,7 @@ if optimized:
     print("=" * 70)
     print()
 
-    optimized_scores = []
-    for i, example in enumerate(trainset):
-        print(f"Testing {i+1}/{len(trainset)}...", end=" ")
-        try:
-            pred = optimized(code=example.code, language=example.language)
-            score = metric(example, pred)
-            optimized_scores.append(score)
-            print(f"{score:.1%}")
-        except Exception as e:
-            print(f"Error: {e}")
-            optimized_scores.append(0.0)
+    optimized_scores = score_program(optimized)
 
     optimized_avg = sum(optimized_scores) / len(optimized_scores) if optimized_scores else 0
     print(f"\n✅ Optimized: {optimized_avg:.1%}\n")
@@ -188,7 +238,7 @@ if optimized:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results = {
         "timestamp": timestamp,
-        "model": "ollama/qwen3",
+        "model": MODEL,
         "baseline": {"average": baseline_avg, "scores": baseline_scores},
         "optimized": {"average": optimized_avg, "scores": optimized_scores},
         "improvement_pct": improvement_pct,
@@ -9,6 +9,7 @@ Cost: Approximately $0.50-2.00 depending on model and iterations.
 import os
 import sys
 import json
+import asyncio
 from pathlib import Path
 from datetime import datetime
 
@@ -16,6 +17,7 @@ sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 import dspy
 from src.utils import read_code_file, save_json
+from src.trim import truncate_to_tokens
 
 
 # Azure OpenAI Configuration
@@ -24,23 +26,34 @@ AZURE_API_BASE = "base_url"
 AZURE_API_VERSION = "2024-10-21"
 AZURE_DEPLOYMENT = "4o-new"
 
+# Code budget per example, counted with the GPT-4o tokenizer
+MAX_CODE_TOKENS = 2000
+TOKEN_ENCODING = "o200k_base"
+
 
 def setup_azure():
     """Configure DSPy with Azure OpenAI."""
     print("🔧 Configuring Azure OpenAI...")
+    # Cache completions on disk so re-runs don't pay for identical requests
+    dspy.configure_cache(
+        enable_disk_cache=True,
+        enable_memory_cache=True,
+        disk_cache_dir=".dspy_cache"
+    )
     lm = dspy.LM(
         f'azure/{AZURE_DEPLOYMENT}',
         api_key=AZURE_API_KEY,
         api_base=AZURE_API_BASE,
-        api_version=AZURE_API_VERSION
+        api_version=AZURE_API_VERSION,
+        cache=True
     )
     dspy.configure(lm=lm)
     print("✅ Azure OpenAI configured\n")
     return lm
 
 
-def load_training_data(limit=None):
-    """Load training examples."""
+def load_training_data(limit=None, max_tokens=None):
+    """Load training examples, truncating code to max_tokens once up front."""
     with open("data/training_data.json") as f:
         data = json.load(f)
 
@@ -50,6 +63,10 @@ def load_training_data(limit=None):
             break
 
         code = read_code_file(case["file_path"])
+        if max_tokens:
+            code = truncate_to_tokens(
+                code, max_tokens, encoding=TOKEN_ENCODING, marker="...[truncated]"
+            )
 
         # Create DSPy example
         example = dspy.Example(
@@ -65,7 +82,7 @@ def load_training_data(limit=None):
     return examples
 
 
-def main():
+async def main():
     print("=" * 70)
     print("REAL SKILL OPTIMIZATION WITH AZURE OPENAI")
     print("=" * 70)
@@ -76,7 +93,7 @@ def main():
 
     # Load limited training data to keep costs low
     print("📚 Loading training data (limited to 2 examples for cost)...")
-    trainset = load_training_data(limit=2)
+    trainset = load_training_data(limit=2, max_tokens=MAX_CODE_TOKENS)
     print(f"   Loaded {len(trainset)} training examples\n")
 
     # Define Code Review Signature
@@ -85,8 +102,10 @@ def main():
     class CodeReview(dspy.Signature):
         """Analyze code and identify security vulnerabilities, bugs, and quality issues."""
 
-        code = dspy.InputField(desc="Source code to review")
+        # The adapter already emits instructions and output format first;
+        # keep the per-example code last so the cacheable prefix is maximal
         language = dspy.InputField(desc="Programming language")
+        code = dspy.InputField(desc="Source code to review")
 
         critical_issues = dspy.OutputField(
             desc="List of CRITICAL security issues (SQL injection, weak crypto, etc.)"
@@ -105,48 +124,48 @@ def main():
     baseline = dspy.Predict(CodeReview)
     print("✅ Baseline created\n")
 
-    # Test baseline on first example
-    print("=" * 70)
-    print("TESTING BASELINE (Before Optimization)")
-    print("=" * 70)
-    print()
+    # Optimize with Chain of Thought
+    print("🚀 Creating Chain of Thought version...")
+    print("   This uses reasoning before answering...")
+    optimized = dspy.ChainOfThought(CodeReview)
+    print("✅ Optimized module created\n")
 
     test_example = trainset[0]
     print(f"Testing on: {test_example.file_path}")
     print()
 
-    print("🔄 Calling Azure OpenAI...")
-    baseline_response = baseline(
-        code=test_example.code[:1000] + "...[truncated]",  # Limit to save tokens
-        language=test_example.language
+    # The two calls are independent, so issue them concurrently
+    print("🔄 Calling Azure OpenAI (baseline and CoT in parallel)...")
+    baseline_response, optimized_response = await asyncio.gather(
+        dspy.asyncify(baseline)(
+            code=test_example.code,
+            language=test_example.language
+        ),
+        dspy.asyncify(optimized)(
+            code=test_example.code,
+            language=test_example.language
+        )
     )
+    print("✅ Responses received\n")
+
+    # Baseline results
+    print("=" * 70)
+    print("BASELINE (Before Optimization)")
+    print("=" * 70)
+    print()
 
-    print("✅ Response received\n")
     print("Baseline Results:")
     print(f"  Critical Issues: {baseline_response.critical_issues}")
     print(f"  High Issues: {baseline_response.high_issues}")
     print(f"  Summary: {baseline_response.summary}")
     print()
 
-    # Optimize with Chain of Thought
+    # Optimized results
     print("=" * 70)
-    print("OPTIMIZING WITH CHAIN OF THOUGHT")
+    print("OPTIMIZED WITH CHAIN OF THOUGHT")
     print("=" * 70)
     print()
 
-    print("🚀 Creating Chain of Thought version...")
-    print("   This uses reasoning before answering...")
-    optimized = dspy.ChainOfThought(CodeReview)
-    print("✅ Optimized module created\n")
-
-    # Test optimized
-    print("🔄 Calling Azure OpenAI with CoT...")
-    optimized_response = optimized(
-        code=test_example.code[:1000] + "...[truncated]",
-        language=test_example.language
-    )
-
-    print("✅ Response received\n")
     print("Optimized Results (with reasoning):")
     if hasattr(optimized_response, 'rationale'):
         print(f"  Reasoning: {optimized_response.rationale[:200]}...")
@@ -229,7 +248,7 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrupted by user")
     except Exception as e:
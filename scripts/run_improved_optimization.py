@@ -11,35 +11,128 @@ This metric measures:
 This should show REAL improvements!
 """
 
+import os
 import sys
+import asyncio
+import argparse
+import functools
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 import dspy
-import json
+import numpy as np
 from datetime import datetime
 from src.improved_evaluator import ImprovedCodeReviewEvaluator, create_improved_metric
-from src.utils import read_code_file, save_json
+from src.utils import read_code_file, load_json_cached, save_json
+from src.trim import trim_code
+from src.azure_config import setup_azure_openai
+from src.signatures import make_predictors, with_split_issues
+
+# Training cases evaluated by default (--n-examples)
+N_EXAMPLES = 5
+
+# Prompt budget for the code under review, after blank/comment lines are dropped
+MAX_CODE_TOKENS = 512
+
+# Concurrent in-flight LM calls; tune to the deployment's TPM limit
+MAX_WORKERS = int(os.getenv("DSPY_THREADS", "16"))
+
+# The Enhanced method is raced against CoT in batches of this many examples
+# and dropped once it can no longer overtake it
+RACE_BATCH_SIZE = 2
+EARLY_STOP_EPSILON = 0.01
+
+
+@functools.lru_cache(maxsize=1)
+def setup_azure(num_threads=MAX_WORKERS):
+    # Credentials come from AZURE_OPENAI_* environment variables; the LM is
+    # only built on first call and reused by any later caller
+    lm = setup_azure_openai()
+    if lm is None:
+        sys.exit(1)
+    dspy.configure(async_max_workers=num_threads)
+    return lm
 
-# Azure OpenAI Configuration
-AZURE_API_KEY = "api_key"
-AZURE_API_BASE = "base_url"
-AZURE_API_VERSION = "2024-10-21"
-AZURE_DEPLOYMENT = "4o-new"
 
+async def score_example(predictors, example, inputs, metric):
+    """Run every predictor on one example concurrently and score each result.
 
-def setup_azure():
-    lm = dspy.LM(
-        f'azure/{AZURE_DEPLOYMENT}',
-        api_key=AZURE_API_KEY,
-        api_base=AZURE_API_BASE,
-        api_version=AZURE_API_VERSION
-    )
-    dspy.configure(lm=lm)
-    return lm
+    `inputs` is the example's input dict, built once and shared by all
+    predictors rather than re-packed per method.
+    """
+    preds = await asyncio.gather(*[
+        dspy.asyncify(predictor)(**inputs)
+        for predictor in predictors.values()
+    ])
+    return {name: metric(example, pred) for name, pred in zip(predictors, preds)}
+
+
+async def race_method(predictor, trainset, trainset_inputs, metric, rival_scores):
+    """Score one method in batches, stopping once it cannot catch its rival.
+
+    Runs alongside the rival's own scoring. `rival_scores` is filled in as
+    the rival's examples finish (NaN until then), so the rival's guaranteed
+    final mean counts unfinished examples as 0. After each batch the
+    method's best possible final mean assumes a perfect score on every
+    remaining example; if even that falls more than EARLY_STOP_EPSILON
+    below the rival's guaranteed mean, the remaining examples are skipped.
+
+    Returns:
+        Per-example scores (NaN where skipped) and whether it stopped early
+    """
+    n = len(trainset)
+    scores = np.full(n, np.nan, dtype=np.float32)
+    run = dspy.asyncify(predictor)
+
+    for start in range(0, n, RACE_BATCH_SIZE):
+        end = min(start + RACE_BATCH_SIZE, n)
+        preds = await asyncio.gather(*[run(**inputs) for inputs in trainset_inputs[start:end]])
+        scores[start:end] = [metric(example, pred) for example, pred in zip(trainset[start:end], preds)]
+
+        upper_bound = (scores[:end].sum() + (n - end)) / n
+        rival_floor = np.nansum(rival_scores) / n
+        if end < n and upper_bound < rival_floor - EARLY_STOP_EPSILON:
+            return scores, True
+
+    return scores, False
+
+
+def print_scores(scores):
+    """Print per-example scores in training-set order."""
+    for i, score in enumerate(scores):
+        print(f"Testing {i+1}/{len(scores)}...")
+        if np.isnan(score):
+            print("  Skipped (early-stopped)\n")
+        else:
+            print(f"  Score: {score:.1%}\n")
 
 
-def main():
+def report_method(header, name, scores):
+    """Print one method's section and return its average score."""
+    print("=" * 70)
+    print(header)
+    print("=" * 70)
+    print()
+
+    print_scores(scores)
+
+    avg = float(np.nanmean(scores))
+    print(f"✅ {name} Average: {avg:.1%}\n")
+    return avg
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare review methods under the improved metric.")
+    parser.add_argument("--n-examples", type=int, default=N_EXAMPLES,
+                        help="Number of training cases to evaluate")
+    parser.add_argument("--num-threads", type=int, default=MAX_WORKERS,
+                        help="Concurrent in-flight LM calls (default: $DSPY_THREADS or 16)")
+    parser.add_argument("--max-code-tokens", type=int, default=MAX_CODE_TOKENS,
+                        help="Token budget for each code sample")
+    return parser.parse_args()
+
+
+async def main(args):
     print("=" * 70)
     print("OPTIMIZATION WITH IMPROVED EVALUATION METRIC")
     print("=" * 70)
@@ -51,134 +144,89 @@ def main():
     print("  ✅ Severity accuracy (right severity levels)")
     print()
 
-    # Setup
-    setup_azure()
+    # Setup runs on a worker thread so LM construction overlaps the file
+    # reads below. It is the only dspy.configure call, so the worker thread
+    # owning dspy.settings is fine.
+    setup_task = asyncio.create_task(asyncio.to_thread(setup_azure, args.num_threads))
 
     # Load training data
-    with open("data/training_data.json") as f:
-        training_data = json.load(f)
-
-    # Create DSPy examples (limit to 5 to save cost/time)
-    print("📚 Loading training examples (using 5 for faster results)...")
-    trainset = []
-    for i, case in enumerate(training_data["training_cases"][:5]):
-        code = read_code_file(case["file_path"])
-
-        example = dspy.Example(
-            code=code[:2000],
+    training_data = await asyncio.to_thread(load_json_cached, "data/training_data.json")
+
+    # Create DSPy examples (limited by --n-examples to save cost/time)
+    print(f"📚 Loading training examples (using {args.n_examples})...")
+    cases = training_data["training_cases"][:args.n_examples]
+    codes = await asyncio.gather(*[
+        asyncio.to_thread(read_code_file, case["file_path"])
+        for case in cases
+    ])
+    trainset = [
+        dspy.Example(
+            code=trim_code(code, args.max_code_tokens, language=case["language"]),
             language=case["language"],
             expected_critical_count=case["severity_distribution"]["Critical"],
             expected_high_count=case["severity_distribution"]["High"],
             description=case["description"]
         ).with_inputs("code", "language")
-
-        trainset.append(example)
+        for code, case in zip(codes, cases)
+    ]
+    # Predictor kwargs per example, built once and reused by every method
+    trainset_inputs = [example.inputs().toDict() for example in trainset]
+    lm = await setup_task
 
     print(f"✅ Loaded {len(trainset)} examples\n")
 
-    # Define signature
-    class CodeReview(dspy.Signature):
-        """Analyze code to find security vulnerabilities and bugs."""
-        code = dspy.InputField(desc="Source code to review")
-        language = dspy.InputField(desc="Programming language")
-        critical_issues = dspy.OutputField(
-            desc="CRITICAL security vulnerabilities. For each issue provide: "
-                "1) Specific vulnerability name, "
-                "2) Location in code, "
-                "3) Impact/exploit scenario, "
-                "4) Fix with code example. "
-                "One issue per line."
-        )
-        high_issues = dspy.OutputField(
-            desc="HIGH priority bugs and issues. For each provide: "
-                "1) Bug description, "
-                "2) Location, "
-                "3) Impact, "
-                "4) How to fix. "
-                "One issue per line."
-        )
-
     # Create evaluator with improved metric
     evaluator = ImprovedCodeReviewEvaluator()
-    metric = create_improved_metric(evaluator)
-
-    # Test 1: Simple Predict (baseline)
-    print("=" * 70)
-    print("BASELINE: Simple Predict")
-    print("=" * 70)
-    print()
-
-    simple = dspy.Predict(CodeReview)
-    simple_scores = []
-
-    for i, example in enumerate(trainset):
-        print(f"Testing {i+1}/{len(trainset)}...")
-        pred = simple(code=example.code, language=example.language)
-        score = metric(example, pred)
-        simple_scores.append(score)
-        print(f"  Score: {score:.1%}\n")
-
-    simple_avg = sum(simple_scores) / len(simple_scores)
-    print(f"✅ Simple Predict Average: {simple_avg:.1%}\n")
-
-    # Test 2: Chain of Thought
-    print("=" * 70)
-    print("METHOD 1: Chain of Thought (Reasoning)")
-    print("=" * 70)
-    print()
-
-    cot = dspy.ChainOfThought(CodeReview)
-    cot_scores = []
-
-    for i, example in enumerate(trainset):
-        print(f"Testing {i+1}/{len(trainset)}...")
-        pred = cot(code=example.code, language=example.language)
-        score = metric(example, pred)
-        cot_scores.append(score)
-        print(f"  Score: {score:.1%}\n")
-
-    cot_avg = sum(cot_scores) / len(cot_scores)
-    print(f"✅ Chain of Thought Average: {cot_avg:.1%}\n")
+    metric = with_split_issues(create_improved_metric(evaluator))
+
+    # One row per method; scoring, reporting and saving are all driven from
+    # this table: (results key, display name, section header, predictor)
+    review_predictors = make_predictors()
+    methods_cfg = [
+        ("baseline", "Simple Predict (Baseline)", "BASELINE: Simple Predict",
+         review_predictors["simple"]),
+        ("chain_of_thought", "Chain of Thought", "METHOD 1: Chain of Thought (Reasoning)",
+         review_predictors["cot"]),
+        ("enhanced", "Enhanced Signature", "METHOD 2: Enhanced Signature (Better Instructions)",
+         review_predictors["enhanced"]),
+    ]
 
-    # Test 3: Enhanced Signature
-    print("=" * 70)
-    print("METHOD 2: Enhanced Signature (Better Instructions)")
-    print("=" * 70)
-    print()
+    # Enhanced is the most expensive method (longest prompt plus reasoning),
+    # so it is raced against CoT instead of always running every example
+    raced_key, rival_key = "enhanced", "chain_of_thought"
+    predictors = {key: predictor for key, _, _, predictor in methods_cfg}
+    raced_predictor = predictors.pop(raced_key)
+
+    # Every (example, method) call for the other methods is issued at once;
+    # the methods share inputs, so there is no reason to wait between passes.
+    # The race runs alongside them, reading the rival's scores as they land.
+    print("🔄 Running all methods on all examples concurrently...\n")
+    rival_scores = np.full(len(trainset), np.nan, dtype=np.float32)
+
+    async def score_and_record(i, example, inputs):
+        example_scores = await score_example(predictors, example, inputs, metric)
+        rival_scores[i] = example_scores[rival_key]
+        return example_scores
+
+    all_scores, (raced_scores, early_stopped) = await asyncio.gather(
+        asyncio.gather(*[
+            score_and_record(i, example, inputs)
+            for i, (example, inputs) in enumerate(zip(trainset, trainset_inputs))
+        ]),
+        race_method(raced_predictor, trainset, trainset_inputs, metric, rival_scores)
+    )
+    scores_by_key = {
+        key: np.asarray([example_scores[key] for example_scores in all_scores], dtype=np.float32)
+        for key in predictors
+    }
+    scores_by_key[raced_key] = raced_scores
 
-    class EnhancedCodeReview(dspy.Signature):
-        """You are a security expert. Find ALL vulnerabilities with specific details.
-
-        IMPORTANT: For each issue you MUST provide:
-        - Exact vulnerability name (e.g., "SQL Injection", not just "security issue")
-        - Precise location (function name and line number)
-        - Realistic exploit scenario
-        - Specific fix with actual code example
-        """
-        code = dspy.InputField()
-        language = dspy.InputField()
-        critical_issues = dspy.OutputField(
-            desc="List EVERY critical security vulnerability. "
-                "Format each as: "
-                "'VULNERABILITY_NAME at LOCATION: DESCRIPTION. Impact: IMPACT. Fix: USE_SPECIFIC_FUNCTION() example: `code`'"
-        )
-        high_issues = dspy.OutputField(
-            desc="List EVERY high-priority bug. "
-                "Format: 'BUG_NAME at LOCATION: DESCRIPTION. Fix with example code.'"
-        )
-
-    enhanced = dspy.ChainOfThought(EnhancedCodeReview)
-    enhanced_scores = []
-
-    for i, example in enumerate(trainset):
-        print(f"Testing {i+1}/{len(trainset)}...")
-        pred = enhanced(code=example.code, language=example.language)
-        score = metric(example, pred)
-        enhanced_scores.append(score)
-        print(f"  Score: {score:.1%}\n")
-
-    enhanced_avg = sum(enhanced_scores) / len(enhanced_scores)
-    print(f"✅ Enhanced Signature Average: {enhanced_avg:.1%}\n")
+    methods = []
+    for key, name, header, _ in methods_cfg:
+        if key == raced_key and early_stopped:
+            name = f"{name} (early-stopped)"
+        scores = scores_by_key[key]
+        methods.append((name, report_method(header, name, scores), scores))
 
     # Compare results
     print("=" * 70)
@@ -186,20 +234,15 @@ def main():
     print("=" * 70)
     print()
 
-    methods = [
-        ("Simple Predict (Baseline)", simple_avg, simple_scores),
-        ("Chain of Thought", cot_avg, cot_scores),
-        ("Enhanced Signature", enhanced_avg, enhanced_scores)
-    ]
-
     print(f"{'Method':<30} {'Avg Score':<12} {'vs Baseline':<15}")
     print("-" * 70)
 
-    baseline = simple_avg
+    baseline = methods[0][1]
+    averages = np.asarray([m[1] for m in methods])
+    improvements = averages - baseline
+    improvements_pct = improvements / baseline * 100 if baseline > 0 else np.zeros_like(improvements)
 
-    for name, avg, scores in methods:
-        improvement = avg - baseline
-        improvement_pct = (improvement / baseline * 100) if baseline > 0 else 0
+    for (name, avg, scores), improvement, improvement_pct in zip(methods, improvements, improvements_pct):
 
         marker = ""
         if avg > baseline:
@@ -214,11 +257,11 @@ def main():
     print()
 
     # Find best method
-    best_idx = methods.index(max(methods, key=lambda x: x[1]))
+    best_idx = int(np.argmax(averages))
     best_name, best_avg, best_scores = methods[best_idx]
 
-    overall_improvement = best_avg - baseline
-    overall_improvement_pct = (overall_improvement / baseline * 100) if baseline > 0 else 0
+    overall_improvement = float(improvements[best_idx])
+    overall_improvement_pct = float(improvements_pct[best_idx])
 
     print("=" * 70)
     print("FINAL RESULT")
@@ -249,31 +292,20 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results = {
         "timestamp": timestamp,
-        "model": f"azure/{AZURE_DEPLOYMENT}",
-        "baseline": {
-            "method": "Simple Predict",
-            "average": simple_avg,
-            "scores": simple_scores
-        },
-        "chain_of_thought": {
-            "method": "Chain of Thought",
-            "average": cot_avg,
-            "scores": cot_scores,
-            "improvement": cot_avg - baseline,
-            "improvement_pct": (cot_avg - baseline) / baseline * 100 if baseline > 0 else 0
-        },
-        "enhanced": {
-            "method": "Enhanced Signature",
-            "average": enhanced_avg,
-            "scores": enhanced_scores,
-            "improvement": enhanced_avg - baseline,
-            "improvement_pct": (enhanced_avg - baseline) / baseline * 100 if baseline > 0 else 0
-        },
+        "model": lm.model
+    }
+    for i, ((key, *_), (name, avg, scores)) in enumerate(zip(methods_cfg, methods)):
+        # save_json writes numpy values as-is (skipped scores become null)
+        results[key] = {"method": name, "average": avg, "scores": scores}
+        if key != "baseline":
+            results[key]["improvement"] = improvements[i]
+            results[key]["improvement_pct"] = improvements_pct[i]
+    results.update({
         "best_method": best_name,
         "best_score": best_avg,
         "overall_improvement": overall_improvement,
         "overall_improvement_pct": overall_improvement_pct
-    }
+    })
 
     save_json(results, f"results/improved_optimization_{timestamp}.json")
     print(f"✅ Detailed results saved to results/improved_optimization_{timestamp}.json")
@@ -282,7 +314,7 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        asyncio.run(main(parse_args()))
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrupted by user")
     except Exception as e:
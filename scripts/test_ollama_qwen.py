@@ -5,16 +5,40 @@ Test with Ollama + Qwen (weaker model) to see real improvements!
 Weaker models benefit MORE from optimization than GPT-4o.
 """
 
+import os
 import sys
+import argparse
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 import dspy
-import json
+import httpx
+import litellm
+import asyncio
 from src.improved_evaluator import ImprovedCodeReviewEvaluator, create_improved_metric
-from src.utils import read_code_file, save_json
+from src.utils import read_code_file, load_json_cached, save_json
+from src.trim import trim_code
+from src.lm_cache import CachedLM
+from src.signatures import ISSUE_FORMAT, make_predictors, with_split_issues
 from datetime import datetime
 
+OLLAMA_BASE = "http://localhost:11434"
+
+parser = argparse.ArgumentParser(description="Compare review methods on a local Qwen model.")
+parser.add_argument("--n-examples", type=int, default=3,
+                    help="Number of training cases to evaluate")
+# Keep concurrency low by default: a single local GPU is the bottleneck
+parser.add_argument("--num-threads", type=int, default=int(os.getenv("DSPY_THREADS", "4")),
+                    help="Concurrent in-flight LM calls (default: $DSPY_THREADS or 4)")
+parser.add_argument("--max-code-tokens", type=int, default=384,
+                    help="Token budget for each code sample (smaller for local model)")
+args = parser.parse_args()
+
+# One pooled transport for every LiteLLM call instead of a connection per request
+_POOL_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+litellm.client_session = httpx.Client(limits=_POOL_LIMITS, timeout=httpx.Timeout(120.0))
+litellm.aclient_session = httpx.AsyncClient(limits=_POOL_LIMITS, timeout=httpx.Timeout(120.0))
+
 print("=" * 70)
 print("TESTING WITH OLLAMA + QWEN (Weaker Model)")
 print("=" * 70)
@@ -26,17 +50,25 @@ print()
 # Configure DSPy for Ollama
 print("🔧 Configuring DSPy with Ollama + Qwen...")
 
+# Fail fast if the server is down, before any examples are run
+try:
+    litellm.client_session.get(f"{OLLAMA_BASE}/api/tags", timeout=5.0).raise_for_status()
+except httpx.HTTPError as e:
+    print(f"❌ Ollama is not reachable at {OLLAMA_BASE}: {e}")
+    print("   Make sure Ollama is running: ollama serve")
+    sys.exit(1)
+
 try:
     # DSPy supports Ollama through LiteLLM
-    lm = dspy.LM(
+    lm = CachedLM(
         'ollama/qwen3',  # Using Ollama provider
-        api_base='http://localhost:11434',  # Default Ollama port
-        temperature=0.3
+        api_base=OLLAMA_BASE,  # Default Ollama port
+        temperature=0.0  # Deterministic, so re-runs are served from the LM cache
     )
-    dspy.configure(lm=lm)
+    dspy.configure(lm=lm, async_max_workers=args.num_threads)
     print("✅ Ollama configured successfully")
     print(f"   Model: qwen3")
-    print(f"   Endpoint: http://localhost:11434")
+    print(f"   Endpoint: {OLLAMA_BASE}")
 except Exception as e:
     print(f"❌ Error configuring Ollama: {e}")
     print("   Make sure Ollama is running: ollama serve")
@@ -45,16 +77,17 @@ except Exception as e:
 print()
 
 # Load data
-with open("data/training_data.json") as f:
-    training_data = json.load(f)
+training_data = load_json_cached("data/training_data.json")
 
 # Use smaller examples for faster testing
-print("📚 Loading examples (using first 3)...")
+print(f"📚 Loading examples (using first {args.n_examples})...")
 testset = []
-for case in training_data["training_cases"][:3]:
-    code = read_code_file(case["file_path"])
+for case in training_data["training_cases"][:args.n_examples]:
+    code = trim_code(
+        read_code_file(case["file_path"]), args.max_code_tokens, language=case["language"]
+    )
     example = dspy.Example(
-        code=code[:1500],  # Smaller for local model
+        code=code,
         language=case["language"],
         expected_critical_count=case["severity_distribution"]["Critical"],
         expected_high_count=case["severity_distribution"]["High"],
@@ -64,17 +97,68 @@ for case in training_data["training_cases"][:3]:
 
 print(f"✅ Loaded {len(testset)} examples\n")
 
-# Define signature
+# Define signatures (shorter wording than the Azure ones, tuned for Qwen)
 class CodeReview(dspy.Signature):
     """Find security vulnerabilities and bugs in code."""
     code = dspy.InputField(desc="Source code to analyze")
     language = dspy.InputField(desc="Programming language")
-    critical_issues = dspy.OutputField(desc="Critical security vulnerabilities with details")
-    high_issues = dspy.OutputField(desc="High priority bugs with details")
+    issues = dspy.OutputField(
+        desc=f"JSON list of critical security vulnerabilities and high priority bugs with details. Each item: {ISSUE_FORMAT}"
+    )
+
+
+class EnhancedCodeReview(dspy.Signature):
+    """You are a security expert. Analyze code for vulnerabilities.
+
+    For each issue found, provide a JSON object with:
+    - severity: "Critical" or "High"
+    - name: vulnerability name (e.g., "SQL Injection")
+    - location: function and line
+    - impact: what an attacker can do
+    - fix: fix with code example
+
+    Example: {"severity": "Critical", "name": "SQL Injection", "location": "authenticate_user:10", "impact": "String concatenation allows arbitrary SQL, compromising the database", "fix": "Use parameterized queries: `cursor.execute(query, (username,))`"}
+    """
+    code = dspy.InputField()
+    language = dspy.InputField()
+    issues = dspy.OutputField(
+        desc=f"JSON list of critical vulnerabilities and high bugs, one item per issue. Each item: {ISSUE_FORMAT}"
+    )
+
+
+predictors = make_predictors(CodeReview, EnhancedCodeReview)
 
 # Create evaluator
 evaluator = ImprovedCodeReviewEvaluator()
-metric = create_improved_metric(evaluator)
+metric = with_split_issues(create_improved_metric(evaluator))
+
+
+def score_program(program):
+    """Run a program on every example concurrently and score the predictions."""
+    async def predict_all():
+        async_program = dspy.asyncify(program)
+        return await asyncio.gather(*[
+            async_program(code=example.code, language=example.language)
+            for example in testset
+        ], return_exceptions=True)
+
+    preds = asyncio.run(predict_all())
+
+    scores = []
+    for i, (example, pred) in enumerate(zip(testset, preds)):
+        print(f"Testing {i+1}/{len(testset)}...", end=" ")
+        try:
+            if isinstance(pred, Exception):
+                raise pred
+            score = metric(example, pred)
+            scores.append(score)
+            print(f"Score: {score:.1%}")
+        except Exception as e:
+            print(f"Error: {e}")
+            scores.append(0.0)
+
+    return scores
+
 
 # TEST 1: Baseline (Simple Predict)
 print("=" * 70)
@@ -82,19 +166,7 @@ print("BASELINE: Simple Predict (No optimization)")
 print("=" * 70)
 print()
 
-baseline = dspy.Predict(CodeReview)
-baseline_scores = []
-
-for i, example in enumerate(testset):
-    print(f"Testing {i+1}/{len(testset)}...", end=" ")
-    try:
-        pred = baseline(code=example.code, language=example.language)
-        score = metric(example, pred)
-        baseline_scores.append(score)
-        print(f"Score: {score:.1%}")
-    except Exception as e:
-        print(f"Error: {e}")
-        baseline_scores.append(0.0)
+baseline_scores = score_program(predictors["simple"])
 
 baseline_avg = sum(baseline_scores) / len(baseline_scores) if baseline_scores else 0
 print(f"\n✅ Baseline Average: {baseline_avg:.1%}\n")
@@ -105,19 +177,7 @@ print("OPTIMIZED: Chain of Thought (Better reasoning)")
 print("=" * 70)
 print()
 
-cot = dspy.ChainOfThought(CodeReview)
-cot_scores = []
-
-for i, example in enumerate(testset):
-    print(f"Testing {i+1}/{len(testset)}...", end=" ")
-    try:
-        pred = cot(code=example.code, language=example.language)
-        score = metric(example, pred)
-        cot_scores.append(score)
-        print(f"Score: {score:.1%}")
-    except Exception as e:
-        print(f"Error: {e}")
-        cot_scores.append(0.0)
+cot_scores = score_program(predictors["cot"])
 
 cot_avg = sum(cot_scores) / len(cot_scores) if cot_scores else 0
 print(f"\n✅ Chain of Thought Average: {cot_avg:.1%}\n")
@@ -128,35 +188,7 @@ print("OPTIMIZED: Few-Shot Examples (Best method)")
 print("=" * 70)
 print()
 
-class EnhancedCodeReview(dspy.Signature):
-    """You are a security expert. Analyze code for vulnerabilities.
-
-    For each issue found, provide:
-    1. Vulnerability name (e.g., "SQL Injection")
-    2. Location (function and line)
-    3. Impact (what attacker can do)
-    4. Fix with code example
-
-    Example: "SQL Injection at authenticate_user:10 - String concatenation allows arbitrary SQL. Impact: Database compromise. Fix: Use parameterized queries."
-    """
-    code = dspy.InputField()
-    language = dspy.InputField()
-    critical_issues = dspy.OutputField(desc="Critical vulnerabilities, one per line with details")
-    high_issues = dspy.OutputField(desc="High bugs, one per line with details")
-
-enhanced = dspy.ChainOfThought(EnhancedCodeReview)
-enhanced_scores = []
-
-for i, example in enumerate(testset):
-    print(f"Testing {i+1}/{len(testset)}...", end=" ")
-    try:
-        pred = enhanced(code=example.code, language=example.language)
-        score = metric(example, pred)
-        enhanced_scores.append(score)
-        print(f"Score: {score:.1%}")
-    except Exception as e:
-        print(f"Error: {e}")
-        enhanced_scores.append(0.0)
+enhanced_scores = score_program(predictors["enhanced"])
 
 enhanced_avg = sum(enhanced_scores) / len(enhanced_scores) if enhanced_scores else 0
 print(f"\n✅ Enhanced Average: {enhanced_avg:.1%}\n")
@@ -5,8 +5,10 @@ This module sets up DSPy to work with Azure OpenAI instead of regular OpenAI.
 """
 
 import os
-from openai import AzureOpenAI
 import dspy
+import httpx
+import litellm
+from .lm_cache import CachedLM
 
 
 def configure_azure_dspy(
@@ -14,7 +16,9 @@ def configure_azure_dspy(
     api_base: str,
     deployment_name: str,
     api_version: str = "2025-01-01-preview",
-    max_tokens: int = 1500
+    max_tokens: int = 800,
+    temperature: float = 0.0,
+    timeout: float = 120.0
 ):
     """
     Configure DSPy to use Azure OpenAI.
@@ -24,28 +28,30 @@ def configure_azure_dspy(
         api_base: Azure OpenAI endpoint
         deployment_name: Model deployment name
         api_version: API version
-        max_tokens: Max tokens for completion
+        max_tokens: Max tokens for completion (both issue lists rarely exceed ~800)
+        temperature: Sampling temperature; 0.0 keeps completions deterministic and cacheable
+        timeout: Per-request timeout in seconds for the pooled transport
     """
 
-    # Create Azure OpenAI client
-    client = AzureOpenAI(
-        api_key=api_key,
-        api_version=api_version,
-        azure_endpoint=api_base
+    # Pooled transport so sequential LM calls reuse TLS connections; set here
+    # rather than at import so merely importing this module leaves LiteLLM alone
+    litellm.client_session = httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=32),
+        timeout=httpx.Timeout(timeout)
     )
 
-    # Configure DSPy with Azure OpenAI
-    # DSPy uses a wrapper for Azure OpenAI
-    lm = dspy.AzureOpenAI(
-        api_base=api_base,
+    # Configure DSPy with Azure OpenAI (routed through LiteLLM); deterministic
+    # completions are replayed from .lm_cache on re-runs
+    lm = CachedLM(
+        f"azure/{deployment_name}",
         api_key=api_key,
+        api_base=api_base,
         api_version=api_version,
-        deployment_id=deployment_name,
-        model=deployment_name,
-        max_tokens=max_tokens
+        max_tokens=max_tokens,
+        temperature=temperature
     )
 
-    dspy.settings.configure(lm=lm)
+    dspy.configure(lm=lm)
 
     return lm
 
@@ -6,12 +6,25 @@ of code review outputs.
 """
 
 import json
+import functools
 from typing import Dict, List, Any, Set
 from dataclasses import dataclass
 import re
 
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
 
-@dataclass
+
+# Compiled once; used on every (expected, predicted) pair during matching
+_WORD_RE = re.compile(r"\w+")
+
+# Severity levels in increasing order
+_SEV_IDX = {"Low": 0, "Medium": 1, "High": 2, "Critical": 3}
+
+
+@dataclass(slots=True, frozen=True)
 class EvaluationResult:
     """Results from evaluating a code review."""
     precision: float  # % of reported issues that are real
@@ -64,13 +77,18 @@ class CodeReviewEvaluator:
         # Match predicted issues to expected issues
         matched = self._match_issues(predicted_issues, expected_issues)
 
+        # All counts come from one pass over the matches
+        tp, fp, fn, crit_total, crit_found, sev_ok, sev_total = self._counts(matched)
+        total_predicted = len(predicted_issues)
+        total_expected = len(expected_issues)
+
         # Calculate metrics
-        precision = self._calculate_precision(matched)
-        recall = self._calculate_recall(matched, len(expected_issues))
+        precision = tp / (tp + fp) if tp + fp else 1.0  # No predictions = no false positives
+        recall = tp / total_expected if total_expected else 1.0  # No expected issues = perfect recall
         f1 = self._calculate_f1(precision, recall)
-        severity_acc = self._calculate_severity_accuracy(matched)
-        critical_recall = self._calculate_critical_recall(matched, expected_issues)
-        fpr = self._calculate_false_positive_rate(matched, len(predicted_issues))
+        severity_acc = sev_ok / sev_total if sev_total else 1.0
+        critical_recall = crit_found / crit_total if crit_total else 1.0  # No critical issues = perfect score
+        fpr = fp / total_predicted if total_predicted else 0.0
         fix_quality = self._evaluate_fix_quality(predicted_issues)
 
         # Weighted overall score
@@ -93,6 +111,28 @@ class CodeReviewEvaluator:
             overall_score=overall
         )
 
+    def evaluate_batch(
+        self,
+        predicted_batch: List[List[Dict[str, Any]]],
+        expected_batch: List[List[Dict[str, Any]]],
+        n_jobs: int = -1
+    ) -> List[EvaluationResult]:
+        """
+        Evaluate many (predicted, expected) pairs across CPU cores.
+
+        Args:
+            predicted_batch: Predicted issue lists, one per review
+            expected_batch: Ground-truth issue lists, aligned with predicted_batch
+            n_jobs: joblib worker count (-1 = all cores)
+
+        Returns:
+            One EvaluationResult per pair, in input order
+        """
+        return Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(self.evaluate)(predicted, expected)
+            for predicted, expected in zip(predicted_batch, expected_batch)
+        )
+
     def _match_issues(
         self,
         predicted: List[Dict],
@@ -101,6 +141,9 @@ class CodeReviewEvaluator:
         """
         Match predicted issues to expected issues using fuzzy matching.
 
+        Pairs are chosen by a maximum-weight bipartite assignment over the
+        similarity matrix, keeping only pairs scoring above 0.6.
+
         Returns:
             List of matches with format:
             {
@@ -109,182 +152,175 @@ class CodeReviewEvaluator:
                 "match_score": float (0-1)
             }
         """
-        matches = []
-        used_predicted = set()
-        used_expected = set()
-
-        # First pass: find exact matches
-        for i, exp in enumerate(expected):
-            best_match = None
-            best_score = 0.0
-
-            for j, pred in enumerate(predicted):
-                if j in used_predicted:
-                    continue
-
-                score = self._issue_similarity(pred, exp)
-                if score > best_score and score > 0.6:  # Threshold for match
-                    best_score = score
-                    best_match = j
-
-            if best_match is not None:
-                matches.append({
-                    "predicted": predicted[best_match],
-                    "expected": exp,
-                    "match_score": best_score
-                })
-                used_predicted.add(best_match)
-                used_expected.add(i)
-
-        # Add unmatched expected (false negatives)
-        for i, exp in enumerate(expected):
-            if i not in used_expected:
-                matches.append({
-                    "predicted": None,
-                    "expected": exp,
-                    "match_score": 0.0
-                })
-
-        # Add unmatched predicted (false positives)
-        for j, pred in enumerate(predicted):
-            if j not in used_predicted:
-                matches.append({
-                    "predicted": pred,
-                    "expected": None,
-                    "match_score": 0.0
-                })
-
-        return matches
+        # Tokenize each issue once rather than once per pair
+        pred_feats = [self._issue_features(pred) for pred in predicted]
+        exp_feats = [self._issue_features(exp) for exp in expected]
 
-    def _issue_similarity(self, pred: Dict, exp: Dict) -> float:
-        """
-        Calculate similarity between predicted and expected issue.
+        # Pairwise similarity; pairs below the match threshold can never be
+        # accepted, so they are zeroed and do not steer the assignment
+        sim = self._similarity_matrix(pred_feats, exp_feats)
+        sim[sim <= 0.6] = 0.0  # Threshold for match
 
-        Uses multiple signals:
-        - Title/description text similarity
-        - Category match
-        - Location match
-        """
-        score = 0.0
+        # Globally optimal one-to-one assignment (Hungarian algorithm)
+        row_ind, col_ind = linear_sum_assignment(1.0 - sim)
 
-        # Text similarity (simple word overlap)
-        pred_text = (pred.get("title", "") + " " + pred.get("description", "")).lower()
-        exp_text = (exp.get("title", "") + " " + exp.get("description", "")).lower()
+        keep = sim[row_ind, col_ind] > 0.0
+        matched_exp = row_ind[keep]
+        matched_pred = col_ind[keep]
 
-        pred_words = set(re.findall(r'\w+', pred_text))
-        exp_words = set(re.findall(r'\w+', exp_text))
+        matches = [
+            {
+                "predicted": predicted[j],
+                "expected": expected[i],
+                "match_score": float(sim[i, j])
+            }
+            for i, j in zip(matched_exp, matched_pred)
+        ]
 
-        if pred_words and exp_words:
-            overlap = len(pred_words & exp_words)
-            total = len(pred_words | exp_words)
-            score += 0.6 * (overlap / total)
+        # Add unmatched expected (false negatives)
+        unmatched_exp = np.setdiff1d(np.arange(len(expected)), matched_exp, assume_unique=True)
+        matches.extend(
+            {"predicted": None, "expected": expected[i], "match_score": 0.0}
+            for i in unmatched_exp
+        )
 
-        # Category match
-        if pred.get("category") == exp.get("category"):
-            score += 0.2
+        # Add unmatched predicted (false positives)
+        unmatched_pred = np.setdiff1d(np.arange(len(predicted)), matched_pred, assume_unique=True)
+        matches.extend(
+            {"predicted": predicted[j], "expected": None, "match_score": 0.0}
+            for j in unmatched_pred
+        )
 
-        # Location match (if provided)
-        pred_locs = set(pred.get("locations", []))
-        exp_locs = set(exp.get("locations", []))
-        if pred_locs and exp_locs:
-            loc_overlap = len(pred_locs & exp_locs)
-            loc_total = len(pred_locs | exp_locs)
-            score += 0.2 * (loc_overlap / loc_total)
+        return matches
 
-        return min(score, 1.0)
+    def _tokens(self, issue: Dict) -> frozenset:
+        """Lowercased word set of an issue's title and description."""
+        text = (issue.get("title", "") + " " + issue.get("description", "")).lower()
+        return frozenset(m.group() for m in _WORD_RE.finditer(text))
+
+    def _issue_features(self, issue: Dict) -> tuple:
+        """Precompute (words, locations, category) for similarity scoring."""
+        return (
+            self._tokens(issue),
+            frozenset(issue.get("locations", [])),
+            issue.get("category")
+        )
 
-    def _calculate_precision(self, matches: List[Dict]) -> float:
-        """Precision: TP / (TP + FP)"""
-        true_positives = sum(1 for m in matches if m["predicted"] and m["expected"])
-        false_positives = sum(1 for m in matches if m["predicted"] and not m["expected"])
+    def _similarity_matrix(self, pred_feats: List[tuple], exp_feats: List[tuple]) -> np.ndarray:
+        """
+        Similarity of every (expected, predicted) pair at once.
 
-        total_predicted = true_positives + false_positives
-        if total_predicted == 0:
-            return 1.0  # No predictions = no false positives
+        Combines word-overlap Jaccard of title/description (0.6), category
+        match (0.2) and location Jaccard (0.2), capped at 1.0. Computed with
+        sparse matrix products instead of per-pair set operations.
 
-        return true_positives / total_predicted
+        Returns:
+            Array of shape (len(exp_feats), len(pred_feats))
+        """
+        text_sim = self._pairwise_jaccard([f[0] for f in exp_feats], [f[0] for f in pred_feats])
+        loc_sim = self._pairwise_jaccard([f[1] for f in exp_feats], [f[1] for f in pred_feats])
 
-    def _calculate_recall(self, matches: List[Dict], total_expected: int) -> float:
-        """Recall: TP / (TP + FN)"""
-        true_positives = sum(1 for m in matches if m["predicted"] and m["expected"])
+        exp_cats = np.array([f[2] for f in exp_feats], dtype=object)
+        pred_cats = np.array([f[2] for f in pred_feats], dtype=object)
+        cat_match = (exp_cats[:, None] == pred_cats[None, :]).astype(np.float64)
 
-        if total_expected == 0:
-            return 1.0  # No expected issues = perfect recall
+        return np.minimum(0.6 * text_sim + 0.2 * cat_match + 0.2 * loc_sim, 1.0)
 
-        return true_positives / total_expected
+    def _pairwise_jaccard(self, a_sets: List[frozenset], b_sets: List[frozenset]) -> np.ndarray:
+        """
+        Jaccard index of every pair of sets, via one sparse matrix product.
 
-    def _calculate_f1(self, precision: float, recall: float) -> float:
-        """F1 Score: 2 * (precision * recall) / (precision + recall)"""
-        if precision + recall == 0:
-            return 0.0
-        return 2 * (precision * recall) / (precision + recall)
+        Pairs where either set is empty score 0.
 
-    def _calculate_severity_accuracy(self, matches: List[Dict]) -> float:
-        """
-        Percentage of matched issues with correct severity.
-        Allows ±1 level tolerance (e.g., High vs Medium is acceptable).
+        Returns:
+            Array of shape (len(a_sets), len(b_sets))
         """
-        severity_order = ["Low", "Medium", "High", "Critical"]
+        vocab = {}
 
-        correct = 0
-        total = 0
+        def incidence(sets):
+            indices, indptr = [], [0]
+            for items in sets:
+                indices.extend(vocab.setdefault(item, len(vocab)) for item in items)
+                indptr.append(len(indices))
+            return indices, indptr
 
-        for match in matches:
-            if match["predicted"] and match["expected"]:
-                pred_sev = match["predicted"].get("severity", "")
-                exp_sev = match["expected"].get("severity", "")
+        a_idx, a_ptr = incidence(a_sets)
+        b_idx, b_ptr = incidence(b_sets)
 
-                try:
-                    pred_idx = severity_order.index(pred_sev)
-                    exp_idx = severity_order.index(exp_sev)
+        shape_a = (len(a_sets), len(vocab))
+        shape_b = (len(b_sets), len(vocab))
+        a_mat = csr_matrix((np.ones(len(a_idx), dtype=np.int32), a_idx, a_ptr), shape=shape_a)
+        b_mat = csr_matrix((np.ones(len(b_idx), dtype=np.int32), b_idx, b_ptr), shape=shape_b)
 
-                    # Exact match or ±1 level
-                    if abs(pred_idx - exp_idx) <= 1:
-                        correct += 1
-                    total += 1
-                except ValueError:
-                    # Severity not in list
-                    total += 1
+        overlap = (a_mat @ b_mat.T).toarray()
+        a_sizes = np.diff(a_ptr)[:, None]
+        b_sizes = np.diff(b_ptr)[None, :]
+        union = a_sizes + b_sizes - overlap
 
-        return correct / total if total > 0 else 1.0
+        jaccard = np.zeros(overlap.shape)
+        np.divide(overlap, union, out=jaccard, where=(a_sizes > 0) & (b_sizes > 0))
+        return jaccard
 
-    def _calculate_critical_recall(
-        self,
-        matches: List[Dict],
-        expected_issues: List[Dict]
-    ) -> float:
-        """
-        Critical recall: % of critical issues found.
-        This is the MOST IMPORTANT metric for security.
+    def _counts(self, matches: List[Dict]) -> tuple:
         """
-        critical_expected = [
-            exp for exp in expected_issues
-            if exp.get("severity") == "Critical"
-        ]
+        Every count the metrics need, from one pass over the matches.
 
-        if not critical_expected:
-            return 1.0  # No critical issues = perfect score
+        Severity is correct when both sides are known levels within ±1
+        (e.g., High vs Medium is acceptable); unknown levels count as wrong.
 
-        critical_found = sum(
-            1 for m in matches
-            if m["expected"] and m["expected"].get("severity") == "Critical"
-            and m["predicted"] is not None
+        Returns:
+            (tp, fp, fn, critical_total, critical_found, severity_correct,
+            severity_total)
+        """
+        has_pred, has_exp, pred_sev, exp_sev = self._match_flags(matches)
+
+        matched = has_pred & has_exp
+        known = matched & (pred_sev >= 0) & (exp_sev >= 0)
+        is_critical = exp_sev == _SEV_IDX["Critical"]
+
+        return (
+            int(matched.sum()),
+            int((has_pred & ~has_exp).sum()),
+            int((~has_pred & has_exp).sum()),
+            int(is_critical.sum()),
+            int((is_critical & has_pred).sum()),
+            int((known & (np.abs(pred_sev - exp_sev) <= 1)).sum()),
+            int(matched.sum())
         )
 
-        return critical_found / len(critical_expected)
+    def _match_flags(self, matches: List[Dict]) -> tuple:
+        """
+        Per-match arrays behind _counts, built in one pass.
 
-    def _calculate_false_positive_rate(
-        self,
-        matches: List[Dict],
-        total_predicted: int
-    ) -> float:
-        """False positive rate: FP / (FP + TP)"""
-        false_positives = sum(1 for m in matches if m["predicted"] and not m["expected"])
+        Returns:
+            (has_pred, has_exp, pred_sev, exp_sev): whether each side is
+            present, and each side's severity index (-1 if absent/unknown)
+        """
+        n = len(matches)
+        has_pred = np.zeros(n, dtype=bool)
+        has_exp = np.zeros(n, dtype=bool)
+        pred_sev = np.full(n, -1, dtype=np.int8)
+        exp_sev = np.full(n, -1, dtype=np.int8)
+
+        for k, m in enumerate(matches):
+            if m["predicted"]:
+                has_pred[k] = True
+                pred_sev[k] = self._severity_index(m["predicted"].get("severity", ""))
+            if m["expected"]:
+                has_exp[k] = True
+                exp_sev[k] = self._severity_index(m["expected"].get("severity", ""))
+
+        return has_pred, has_exp, pred_sev, exp_sev
+
+    def _severity_index(self, severity: str) -> int:
+        """Position in Low < Medium < High < Critical, or -1 if unknown."""
+        return _SEV_IDX.get(severity, -1) if isinstance(severity, str) else -1
 
-        if total_predicted == 0:
+    def _calculate_f1(self, precision: float, recall: float) -> float:
+        """F1 Score: 2 * (precision * recall) / (precision + recall)"""
+        if precision + recall == 0:
             return 0.0
-
-        return false_positives / total_predicted
+        return 2 * (precision * recall) / (precision + recall)
 
     def _evaluate_fix_quality(self, predicted_issues: List[Dict]) -> float:
         """
@@ -299,26 +335,25 @@ class CodeReviewEvaluator:
         if not predicted_issues:
             return 0.0
 
-        total_score = 0.0
-
-        for issue in predicted_issues:
-            fix_score = 0.0
+        # One pass fills a boolean column per criterion; scoring is vectorized
+        n = len(predicted_issues)
+        has_fix = np.zeros(n, dtype=bool)
+        has_code = np.zeros(n, dtype=bool)
+        has_explanation = np.zeros(n, dtype=bool)
 
-            # Has fix description
-            if issue.get("fix_description") or issue.get("suggested_fix"):
-                fix_score += 0.3
+        for k, issue in enumerate(predicted_issues):
+            fix_desc = issue.get("fix_description")
+            suggested = issue.get("suggested_fix")
 
-            # Has code example
-            if issue.get("code_example") or "```" in str(issue.get("suggested_fix", "")):
-                fix_score += 0.4
+            # Text forms, converting only values that are not already strings
+            fd = fix_desc if isinstance(fix_desc, str) else ("" if fix_desc is None else str(fix_desc))
+            sf = suggested if isinstance(suggested, str) else ("" if suggested is None else str(suggested))
 
-            # Has explanation
-            if issue.get("explanation") or len(str(issue.get("fix_description", ""))) > 50:
-                fix_score += 0.3
+            has_fix[k] = bool(fix_desc or suggested)  # Has fix description
+            has_code[k] = bool(issue.get("code_example") or "```" in sf)  # Has code example
+            has_explanation[k] = bool(issue.get("explanation") or len(fd) > 50)  # Has explanation
 
-            total_score += fix_score
-
-        return total_score / len(predicted_issues)
+        return float((0.3 * has_fix + 0.4 * has_code + 0.3 * has_explanation).mean())
 
 
 def create_metric_function(evaluator: CodeReviewEvaluator):
@@ -331,6 +366,36 @@ def create_metric_function(evaluator: CodeReviewEvaluator):
     Returns:
         Function that can be used with DSPy optimizers
     """
+    def predicted_issues(prediction, parsed=None):
+        """Issues from a prediction, decoding JSON strings (memoized in `parsed`)."""
+        # Extract predicted issues from prediction
+        predicted = prediction.issues if hasattr(prediction, 'issues') else []
+
+        # Parse if it's a string
+        if isinstance(predicted, str):
+            if parsed is not None and predicted in parsed:
+                return parsed[predicted]
+            raw = predicted
+            try:
+                predicted = json.loads(raw)
+            except:
+                predicted = []
+            if parsed is not None:
+                parsed[raw] = predicted
+
+        return predicted
+
+    def expected_issues(example):
+        """Ground-truth issues from an example."""
+        return example.expected_issues if hasattr(example, 'expected_issues') else []
+
+    # Optimizers re-score the same (prediction, expected) pairs across
+    # candidate programs; evaluation is pure, so scores are memoized on a
+    # canonical JSON form of both issue lists
+    @functools.lru_cache(maxsize=4096)
+    def cached_score(predicted_json: str, expected_json: str) -> float:
+        return evaluator.evaluate(json.loads(predicted_json), json.loads(expected_json)).overall_score
+
     def metric(example, prediction, trace=None) -> float:
         """
         DSPy metric function.
@@ -343,22 +408,34 @@ def create_metric_function(evaluator: CodeReviewEvaluator):
         Returns:
             Score from 0.0 to 1.0 (higher is better)
         """
-        # Extract predicted issues from prediction
-        predicted = prediction.issues if hasattr(prediction, 'issues') else []
+        predicted = predicted_issues(prediction)
+        expected = expected_issues(example)
 
-        # Parse if it's a string
-        if isinstance(predicted, str):
-            try:
-                predicted = json.loads(predicted)
-            except:
-                predicted = []
+        try:
+            predicted_json = json.dumps(predicted, sort_keys=True)
+            expected_json = json.dumps(expected, sort_keys=True)
+        except (TypeError, ValueError):
+            # Not JSON-serializable; evaluate without memoization
+            return evaluator.evaluate(predicted, expected).overall_score
 
-        # Get expected issues from example
-        expected = example.expected_issues if hasattr(example, 'expected_issues') else []
+        return cached_score(predicted_json, expected_json)
 
-        # Evaluate
-        result = evaluator.evaluate(predicted, expected)
+    def batch(examples, predictions, n_jobs: int = -1) -> List[float]:
+        """
+        Score many (example, prediction) pairs in parallel.
+
+        Identical JSON issue strings within the batch are decoded once.
 
-        return result.overall_score
+        Returns:
+            One score per pair, in input order
+        """
+        parsed = {}
+        results = evaluator.evaluate_batch(
+            [predicted_issues(prediction, parsed) for prediction in predictions],
+            [expected_issues(example) for example in examples],
+            n_jobs=n_jobs
+        )
+        return [result.overall_score for result in results]
 
+    metric.batch = batch
     return metric
@@ -10,11 +10,65 @@ This metric measures multiple dimensions:
 """
 
 import re
+import functools
 from typing import List, Dict, Any
 from dataclasses import dataclass
 
+from joblib import Parallel, delayed
 
-@dataclass
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional; fall back to substring scans
+    ahocorasick = None
+
+
+# Compiled once; used on every line of every parsed LLM output
+_LOC_RE = re.compile(r"in\s+\w+|at\s+line|location:", re.I)
+
+# Words that mark an issue line as describing impact / suggesting a fix
+_IMPACT_KW = ("impact", "allows", "can", "enables", "leads to")
+_FIX_KW = ("use", "should", "replace", "change", "instead")
+
+_IMPACT_BIT = 1
+_FIX_BIT = 2
+
+
+def _build_keyword_automaton():
+    """One Aho-Corasick automaton over every keyword class, valued by class bitmask."""
+    bits = {}
+    for kw in _IMPACT_KW:
+        bits[kw] = bits.get(kw, 0) | _IMPACT_BIT
+    for kw in _FIX_KW:
+        bits[kw] = bits.get(kw, 0) | _FIX_BIT
+
+    automaton = ahocorasick.Automaton()
+    for kw, bit in bits.items():
+        automaton.add_word(kw, bit)
+    automaton.make_automaton()
+    return automaton
+
+
+if ahocorasick is not None:
+    _KEYWORDS = _build_keyword_automaton()
+
+    def _keyword_mask(low: str) -> int:
+        """Bitmask of keyword classes found in a lowercased line (one linear scan)."""
+        mask = 0
+        for _, bit in _KEYWORDS.iter(low):
+            mask |= bit
+        return mask
+else:
+    def _keyword_mask(low: str) -> int:
+        """Bitmask of keyword classes found in a lowercased line."""
+        mask = 0
+        if any(kw in low for kw in _IMPACT_KW):
+            mask |= _IMPACT_BIT
+        if any(kw in low for kw in _FIX_KW):
+            mask |= _FIX_BIT
+        return mask
+
+
+@dataclass(slots=True, frozen=True)
 class ImprovedEvaluationResult:
     """Comprehensive evaluation results."""
     issue_detection_score: float  # 0-1, how many issues found
@@ -90,15 +144,9 @@ class ImprovedCodeReviewEvaluator:
         if found_high >= expected_high_count * 0.8:
             severity_score += 0.25
 
-        # 3. Explanation Quality
-        explanation_score = self._evaluate_explanation_quality(
-            critical_issues + high_issues
-        )
-
-        # 4. Fix Quality
-        fix_score = self._evaluate_fix_quality(
-            critical_issues + high_issues
-        )
+        # 3. Explanation Quality and 4. Fix Quality (one pass over all issues)
+        all_issues = critical_issues + high_issues
+        explanation_score, fix_score = self._evaluate_quality(all_issues)
 
         # 5. False Positive Rate
         total_found = found_critical + found_high
@@ -126,6 +174,34 @@ class ImprovedCodeReviewEvaluator:
             overall_score=overall
         )
 
+    def evaluate_batch(
+        self,
+        critical_texts: List[str],
+        high_texts: List[str],
+        expected_critical_counts: List[int],
+        expected_high_counts: List[int],
+        n_jobs: int = -1
+    ) -> List[ImprovedEvaluationResult]:
+        """
+        Evaluate many LLM outputs across CPU cores.
+
+        Args:
+            critical_texts: Critical issues outputs, one per review
+            high_texts: High issues outputs, aligned with critical_texts
+            expected_critical_counts: Expected critical counts, aligned
+            expected_high_counts: Expected high counts, aligned
+            n_jobs: joblib worker count (-1 = all cores)
+
+        Returns:
+            One ImprovedEvaluationResult per review, in input order
+        """
+        return Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(self.evaluate)(critical, high, exp_critical, exp_high)
+            for critical, high, exp_critical, exp_high in zip(
+                critical_texts, high_texts, expected_critical_counts, expected_high_counts
+            )
+        )
+
     def _parse_issues(self, text: str) -> List[Dict[str, str]]:
         """Parse issues from LLM text output."""
         if not text or text == "N/A":
@@ -142,89 +218,72 @@ class ImprovedCodeReviewEvaluator:
                 continue
 
             # Skip markdown headers
-            if line.startswith('#'):
+            if line[0] == '#':
                 continue
 
-            # Extract issue information
-            issue = {
+            # Extract issue information; the keyword mask is kept so fix
+            # scoring can reuse it instead of rescanning the line
+            low = line.lower()
+            mask = _keyword_mask(low)
+            issues.append({
                 "text": line,
+                "keyword_mask": mask,
                 "has_details": len(line) > 50,
-                "has_location": bool(re.search(r'in\s+\w+|at\s+line|location:', line, re.I)),
-                "has_impact": any(word in line.lower() for word in ['impact', 'allows', 'can', 'enables', 'leads to']),
-                "has_example": '```' in line or 'example:' in line.lower()
-            }
-
-            issues.append(issue)
+                "has_location": bool(_LOC_RE.search(line)),
+                "has_impact": bool(mask & _IMPACT_BIT),
+                "has_example": '```' in line or 'example:' in low
+            })
 
         return issues
 
-    def _evaluate_explanation_quality(self, issues: List[Dict]) -> float:
+    def _evaluate_quality(self, issues: List[Dict]) -> tuple:
         """
-        Evaluate how well issues are explained.
+        Evaluate how well issues are explained and how good their fixes are.
 
         Good explanations have:
         - Specific details (>50 chars)
         - Location information
         - Impact description
+
+        Good fixes:
+        - Are specific
+        - Include code examples
+        - Explain why the fix works
+
+        Returns:
+            (explanation_score, fix_score)
         """
+        # Both means share this guard and the same sum/len reduction
         if not issues:
-            return 0.0
+            return 0.0, 0.0
 
-        quality_scores = []
+        explanation_total = 0.0
+        fix_total = 0.0
 
         for issue in issues:
-            score = 0.0
+            text = issue.get("text", "")
 
-            # Has substantial details
+            # Explanation: substantial details, location, impact
+            score = 0.0
             if issue.get("has_details"):
                 score += 0.4
-
-            # Has location information
             if issue.get("has_location"):
                 score += 0.3
-
-            # Has impact description
             if issue.get("has_impact"):
                 score += 0.3
+            explanation_total += score
 
-            quality_scores.append(score)
-
-        return sum(quality_scores) / len(quality_scores)
-
-    def _evaluate_fix_quality(self, issues: List[Dict]) -> float:
-        """
-        Evaluate quality of suggested fixes.
-
-        Good fixes:
-        - Are specific
-        - Include code examples
-        - Explain why the fix works
-        """
-        if not issues:
-            return 0.0
-
-        fix_scores = []
-
-        for issue in issues:
+            # Fix: suggestion, code example, explanation
             score = 0.0
-
-            text = issue.get("text", "").lower()
-
-            # Has fix suggestion
-            if any(word in text for word in ['use', 'should', 'replace', 'change', 'instead']):
+            if issue.get("keyword_mask", 0) & _FIX_BIT:
                 score += 0.4
-
-            # Has code example
             if issue.get("has_example") or '`' in text:
                 score += 0.4
-
-            # Has explanation
             if len(text) > 100:
                 score += 0.2
+            fix_total += score
 
-            fix_scores.append(score)
-
-        return sum(fix_scores) / len(fix_scores)
+        return explanation_total / len(issues), fix_total / len(issues)
 
     def _f1_score(self, precision: float, recall: float) -> float:
         """Calculate F1 score."""
@@ -243,6 +302,17 @@ def create_improved_metric(evaluator: ImprovedCodeReviewEvaluator):
     Returns:
         Function that can be used with DSPy optimizers
     """
+    # Optimizers re-score the same outputs across candidate programs;
+    # evaluation only depends on these four values, so it is memoized
+    @functools.lru_cache(maxsize=4096)
+    def cached_score(critical_text: str, high_text: str, expected_critical, expected_high) -> float:
+        return evaluator.evaluate(
+            critical_issues_text=critical_text,
+            high_issues_text=high_text,
+            expected_critical_count=expected_critical,
+            expected_high_count=expected_high
+        ).overall_score
+
     def metric(example, prediction, trace=None) -> float:
         """
         DSPy metric function.
@@ -263,18 +333,34 @@ def create_improved_metric(evaluator: ImprovedCodeReviewEvaluator):
         expected_critical = getattr(example, 'expected_critical_count', 0)
         expected_high = getattr(example, 'expected_high_count', 0)
 
-        # Get code for context
-        code = getattr(example, 'code', '')
+        # Evaluate (code_sample is not used by the scoring, so not part of the key)
+        try:
+            return cached_score(critical_text, high_text, expected_critical, expected_high)
+        except TypeError:
+            # Unhashable expected counts; evaluate without memoization
+            return evaluator.evaluate(
+                critical_issues_text=critical_text,
+                high_issues_text=high_text,
+                expected_critical_count=expected_critical,
+                expected_high_count=expected_high,
+                code_sample=getattr(example, 'code', '')
+            ).overall_score
+
+    def batch(examples, predictions, n_jobs: int = -1) -> List[float]:
+        """
+        Score many (example, prediction) pairs in parallel.
 
-        # Evaluate
-        result = evaluator.evaluate(
-            critical_issues_text=critical_text,
-            high_issues_text=high_text,
-            expected_critical_count=expected_critical,
-            expected_high_count=expected_high,
-            code_sample=code
+        Returns:
+            One score per pair, in input order
+        """
+        results = evaluator.evaluate_batch(
+            [str(getattr(prediction, 'critical_issues', '')) for prediction in predictions],
+            [str(getattr(prediction, 'high_issues', '')) for prediction in predictions],
+            [getattr(example, 'expected_critical_count', 0) for example in examples],
+            [getattr(example, 'expected_high_count', 0) for example in examples],
+            n_jobs=n_jobs
         )
+        return [result.overall_score for result in results]
 
-        return result.overall_score
-
+    metric.batch = batch
     return metric
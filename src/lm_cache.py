@@ -0,0 +1,52 @@
+"""
+Persistent LM Response Cache
+
+This module wraps dspy.LM so that identical, deterministic completions are
+served from an on-disk cache instead of being re-sent to the provider.
+"""
+
+import os
+import dspy
+from diskcache import Cache
+from .utils import compute_cache_key
+
+
+DEFAULT_CACHE_DIR = ".lm_cache"
+
+
+class CachedLM(dspy.LM):
+    """
+    dspy.LM with a persistent completion cache.
+
+    Completions are keyed on (model, prompt/messages, sampling kwargs). Only
+    temperature=0 calls are cached, since sampled outputs are not meant to be
+    replayed. Set LM_CACHE=0 to bypass the cache (e.g. for benchmark runs).
+    """
+
+    def __init__(self, model: str, cache_dir: str = DEFAULT_CACHE_DIR, **kwargs):
+        """
+        Initialize the cached LM.
+
+        Args:
+            model: LiteLLM model name (e.g. "azure/4o-new")
+            cache_dir: Directory for the on-disk cache
+            **kwargs: Passed through to dspy.LM
+        """
+        super().__init__(model, **kwargs)
+        self.cache_enabled = os.getenv("LM_CACHE", "1") != "0"
+        self.response_cache = Cache(cache_dir) if self.cache_enabled else None
+
+    def __call__(self, prompt=None, messages=None, **kwargs):
+        temperature = kwargs.get("temperature", self.kwargs.get("temperature", 0.0))
+
+        if self.response_cache is None or temperature != 0:
+            return super().__call__(prompt=prompt, messages=messages, **kwargs)
+
+        key = compute_cache_key(self.model, prompt, messages, {**self.kwargs, **kwargs})
+
+        outputs = self.response_cache.get(key)
+        if outputs is None:
+            outputs = super().__call__(prompt=prompt, messages=messages, **kwargs)
+            self.response_cache.set(key, outputs)
+
+        return outputs
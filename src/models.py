@@ -64,10 +64,11 @@ class CodeReviewModule(dspy.Module):
 
     def __init__(self):
         super().__init__()
-        # Use ChainOfThought for complex reasoning tasks
+        # Use ChainOfThought for complex reasoning tasks; fixes already
+        # carry their explanation in fix_description, so Predict suffices
         self.detect_issues = dspy.ChainOfThought(IssueDetection)
         self.classify_severity = dspy.Predict(SeverityClassification)
-        self.suggest_fix = dspy.ChainOfThought(FixSuggestion)
+        self.suggest_fix = dspy.Predict(FixSuggestion)
 
     def forward(self, code: str, language: str):
         """
@@ -121,16 +122,22 @@ class OptimizedCodeReviewModule(dspy.Module):
             "code, language -> quality_issues: Code smells, maintainability issues, best practice violations"
         )
 
-        # Fix generation with examples
-        self.generate_fix = dspy.ChainOfThought(FixSuggestion)
+        # Fix generation with examples (fix_description is the explanation)
+        self.generate_fix = dspy.Predict(FixSuggestion)
 
     def forward(self, code: str, language: str):
         """Run multi-path analysis."""
 
-        # Run all detections in parallel conceptually
-        security = self.detect_security(code=code, language=language)
-        performance = self.detect_performance(code=code, language=language)
-        quality = self.detect_quality(code=code, language=language)
+        # The three detections are independent LM calls, so overlap them.
+        # dspy.Parallel carries the caller's dspy.context() overrides (lm,
+        # trace) into its worker threads; any failure aborts the review.
+        inputs = {"code": code, "language": language}
+        parallel = dspy.Parallel(num_threads=3, max_errors=1, disable_progress_bar=True)
+        security, performance, quality = parallel([
+            (self.detect_security, inputs),
+            (self.detect_performance, inputs),
+            (self.detect_quality, inputs)
+        ])
 
         # Combine results
         all_issues = {
@@ -154,7 +161,8 @@ class FewShotCodeReview(dspy.Module):
 
     def __init__(self):
         super().__init__()
-        self.review = dspy.ChainOfThought(
+        # The bootstrapped demos carry the guidance, so no reasoning field
+        self.review = dspy.Predict(
             "code, language -> issues, severity_counts, overall_assessment"
         )
 
@@ -0,0 +1,176 @@
+"""
+Code Review Signatures
+
+DSPy signatures for the code review task and a factory for the predictors
+compared by the optimization scripts. Defined once at module scope so the
+signatures are built once per process rather than on every run.
+
+Issues are returned as a single JSON list rather than separate critical/high
+fields, which roughly halves the answer the LM has to decode; split_issues()
+turns it back into the per-severity text the evaluators expect.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+import dspy
+
+
+logger = logging.getLogger(__name__)
+
+_DECODER = json.JSONDecoder()
+
+
+# Shape of one item in the JSON `issues` output
+ISSUE_FORMAT = '{"severity": "Critical|High", "name": ..., "location": ..., "impact": ..., "fix": ...}'
+
+
+class CodeReview(dspy.Signature):
+    """Analyze code to find security vulnerabilities and bugs."""
+    code = dspy.InputField(desc="Source code to review")
+    language = dspy.InputField(desc="Programming language")
+    issues = dspy.OutputField(
+        desc="JSON list of CRITICAL security vulnerabilities and HIGH priority bugs. "
+            f"Each item: {ISSUE_FORMAT} with "
+            "1) Specific vulnerability or bug name, "
+            "2) Location in code, "
+            "3) Impact/exploit scenario, "
+            "4) Fix with code example."
+    )
+
+
+class EnhancedCodeReview(dspy.Signature):
+    """You are a security expert. Find ALL vulnerabilities with specific details.
+
+    IMPORTANT: For each issue you MUST provide:
+    - Exact vulnerability name (e.g., "SQL Injection", not just "security issue")
+    - Precise location (function name and line number)
+    - Realistic exploit scenario
+    - Specific fix with actual code example
+    """
+    code = dspy.InputField()
+    language = dspy.InputField()
+    issues = dspy.OutputField(
+        desc="JSON list of EVERY critical security vulnerability and high-priority bug. "
+            f"Each item: {ISSUE_FORMAT} where name is e.g. VULNERABILITY_NAME, "
+            "location is the function and line, and fix is "
+            "'USE_SPECIFIC_FUNCTION() example: `code`'"
+    )
+
+
+def _decode_items(text: str, start: int) -> Tuple[List[Any], bool]:
+    """
+    Decode the items of the JSON list opening at text[start] one by one.
+
+    Returns:
+        (items, complete): every item decoded before the list ended or the
+        text stopped parsing (e.g. cut off by max_tokens), and whether the
+        closing ']' was reached
+    """
+    items = []
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text):
+            return items, False
+        if text[pos] == "]":
+            return items, True
+        try:
+            item, pos = _DECODER.raw_decode(text, pos)
+        except ValueError:
+            return items, False
+        items.append(item)
+
+
+def _issue_line(item: Dict[str, Any]) -> str:
+    """
+    One issue as text: the name followed by whichever fields the LM filled.
+
+    Field text is emitted as-is, without "Location:"/"Impact:"/"Fix:"
+    labels, since those words alone satisfy the evaluators' explanation
+    and fix checks and would inflate scores relative to free-text runs.
+    """
+    parts = [str(item[key]) for key in ("location", "impact", "fix") if item.get(key)]
+
+    name = str(item.get("name") or item.get("type"))
+    return f"{name} - {'; '.join(parts)}" if parts else name
+
+
+def split_issues(issues_json: str) -> Tuple[str, str]:
+    """
+    Split a JSON `issues` output into critical and high issue text.
+
+    Args:
+        issues_json: LM output; the first [...] list is parsed, so code
+            fences or stray prose around it are tolerated
+
+    Returns:
+        (critical_text, high_text), one issue per line. Items without a
+        name/type are dropped. A list cut off mid-way keeps its complete
+        items; output with no list at all is passed through as high_text.
+    """
+    text = str(issues_json or "")
+    start = text.find("[")
+
+    if start == -1:
+        if text.strip():
+            logger.warning("issues output is not a JSON list; scoring it as raw text")
+        return "", text
+
+    items, complete = _decode_items(text, start)
+    if not complete:
+        logger.warning(
+            "issues output is truncated or malformed JSON; kept %d complete item(s)",
+            len(items)
+        )
+
+    critical, high = [], []
+    for item in items:
+        if not isinstance(item, dict) or not (item.get("name") or item.get("type")):
+            continue
+
+        line = _issue_line(item)
+        if str(item.get("severity", "")).lower() == "critical":
+            critical.append(line)
+        else:
+            high.append(line)
+
+    return "\n".join(critical), "\n".join(high)
+
+
+def with_split_issues(metric):
+    """
+    Adapt a metric that reads critical_issues/high_issues to `issues` outputs.
+
+    Args:
+        metric: DSPy metric, e.g. from create_improved_metric()
+
+    Returns:
+        Metric that splits prediction.issues before delegating
+    """
+    def wrapped(example, prediction, trace=None):
+        critical, high = split_issues(getattr(prediction, "issues", ""))
+        split = dspy.Prediction(critical_issues=critical, high_issues=high)
+        return metric(example, split, trace)
+
+    return wrapped
+
+
+def make_predictors(review=CodeReview, enhanced=EnhancedCodeReview):
+    """
+    Build the predictors compared by the optimization scripts.
+
+    Args:
+        review: Signature for the Simple and Chain of Thought methods
+        enhanced: Signature for the Enhanced method
+
+    Returns:
+        Dictionary of predictors keyed "simple", "cot" and "enhanced"
+    """
+    return {
+        "simple": dspy.Predict(review),
+        "cot": dspy.ChainOfThought(review),
+        "enhanced": dspy.ChainOfThought(enhanced),
+    }
@@ -0,0 +1,113 @@
+"""
+Token-aware trimming of code payloads.
+
+Code sent to the LM is budgeted in model tokens rather than characters, so
+dense code is not over-sent and sparse code is not over-truncated.
+"""
+
+import re
+import functools
+from typing import Optional
+
+import tiktoken
+
+
+# cl100k_base is a reasonable proxy for models without a tiktoken encoding
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """
+    Get a tiktoken encoding, constructing it only once per process.
+
+    Args:
+        name: Encoding name (e.g. "cl100k_base", "o200k_base")
+
+    Returns:
+        tiktoken Encoding
+    """
+    return tiktoken.get_encoding(name)
+
+
+def truncate_to_tokens(
+    code: str,
+    max_tokens: int,
+    encoding: str = DEFAULT_ENCODING,
+    marker: str = ""
+) -> str:
+    """
+    Truncate code to at most max_tokens tokens.
+
+    Args:
+        code: Source code to truncate
+        max_tokens: Token budget
+        encoding: tiktoken encoding used to count tokens
+        marker: Suffix appended when the code was truncated
+
+    Returns:
+        The code unchanged if it fits, otherwise its first max_tokens tokens
+    """
+    enc = get_encoding(encoding)
+    ids = enc.encode(code)
+
+    if len(ids) <= max_tokens:
+        return code
+
+    return enc.decode(ids[:max_tokens]) + marker
+
+
+# Whole-line comment markers per language. Only languages listed here get
+# comment lines dropped: "#" is a comment in Python but starts a private
+# field in JS/TS ("#count = 0;"), so it must not be stripped there.
+_COMMENT_LINE = {
+    "python": re.compile(r"\s*#"),
+    "ruby": re.compile(r"\s*#"),
+    "shell": re.compile(r"\s*#"),
+    "javascript": re.compile(r"\s*//"),
+    "typescript": re.compile(r"\s*//"),
+    "java": re.compile(r"\s*//"),
+    "go": re.compile(r"\s*//"),
+}
+
+
+def trim_code(
+    src: str,
+    max_tokens: int,
+    encoding: str = DEFAULT_ENCODING,
+    language: Optional[str] = None
+) -> str:
+    """
+    Drop blank and whole-line comment lines, then keep whole lines up to a token budget.
+
+    If whole lines would fill less than half the budget (e.g. minified code
+    or a very long first line), the stripped code is cut at the token
+    budget instead, so the LM never gets an empty or near-empty payload.
+
+    Args:
+        src: Source code to trim
+        max_tokens: Token budget (each kept line also costs one newline token)
+        encoding: tiktoken encoding used to count tokens
+        language: Source language; comment lines are only dropped for
+            languages with a known comment marker
+
+    Returns:
+        The leading lines of the stripped code that fit in max_tokens
+    """
+    enc = get_encoding(encoding)
+    comment = _COMMENT_LINE.get((language or "").lower())
+    lines = [line for line in src.splitlines()
+             if line.strip() and not (comment and comment.match(line))]
+
+    used, out = 0, []
+    for line in lines:
+        cost = len(enc.encode(line)) + 1
+        if used + cost > max_tokens:
+            break
+        out.append(line)
+        used += cost
+
+    if len(out) < len(lines) and used < max_tokens // 2:
+        return truncate_to_tokens("\n".join(lines), max_tokens, encoding)
+
+    return "\n".join(out)
@@ -2,44 +2,104 @@
 Utility functions for skill optimization.
 """
 
+import os
+import re
 import json
+import time
+import hashlib
+import functools
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, Optional, TextIO, Set, Union
 
 
-def load_json(file_path: str) -> Dict[str, Any]:
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
+
+try:
+    import re2
+except ImportError:  # google-re2 is optional; fall back to the stdlib engine
+    re2 = None
+
+
+# Patterns for extract_issues_from_llm_output, e.g. "Issue #1:", "**Issue 1**:".
+# Flags are inline so the same pattern compiles under re and re2; re2 scans
+# in linear time, which matters on multi-KB LLM outputs.
+_regex = re2 if re2 is not None else re
+_ISSUE_RE = _regex.compile(r'(?im)(?:Issue|Problem)\s*#?(\d+)[:\s]*([^\n]+)')
+_SEVERITY_RE = _regex.compile(r'(?i)Severity[:\s]*(Critical|High|Medium|Low)')
+
+# File paths may be given as str or Path
+PathLike = Union[str, os.PathLike]
+
+# Output directories already created by this process
+_ENSURED_DIRS: Set[Path] = set()
+
+
+def _ensure_dir(path: Path):
+    """Create a directory (and parents) unless this process already did."""
+    if path not in _ENSURED_DIRS:
+        path.mkdir(parents=True, exist_ok=True)
+        _ENSURED_DIRS.add(path)
+
+
+def load_json(file_path: PathLike) -> Dict[str, Any]:
     """
     Load JSON file.
 
+    Parsed with orjson straight from the file's bytes when it is installed.
+
     Args:
         file_path: Path to JSON file
 
     Returns:
         Parsed JSON data
     """
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    if orjson is None:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    return orjson.loads(Path(file_path).read_bytes())
 
 
-def save_json(data: Dict[str, Any], file_path: str, indent: int = 2):
+def save_json(data: Dict[str, Any], file_path: PathLike, indent: Optional[int] = 2):
     """
     Save data to JSON file.
 
+    Serialized with orjson when it is installed and the indent is one it
+    supports (2, or 0/None for compact output); it also accepts numpy
+    arrays and scalars directly (NaN is written as null). Other indents,
+    or a missing orjson, go through the stdlib json module.
+
     Args:
         data: Data to save
         file_path: Output path
         indent: JSON indentation
     """
-    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    path = Path(file_path)
+    _ensure_dir(path.parent)
 
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=indent)
+    if orjson is None or indent not in (None, 0, 2):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=indent)
+        return
 
+    # Non-str keys ({1: 2}) are written as strings, as json.dump does
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    path.write_bytes(orjson.dumps(data, option=option))
 
-def read_code_file(file_path: str) -> str:
+
+@functools.lru_cache(maxsize=None)
+def read_code_file(file_path: PathLike) -> str:
     """
     Read a code file.
 
+    Results are cached per path for the lifetime of the process, so repeated
+    reads of the same training file do not hit the disk again.
+
     Args:
         file_path: Path to code file
 
@@ -50,68 +110,119 @@ def read_code_file(file_path: str) -> str:
         return f.read()
 
 
-def format_evaluation_results(results: Dict[str, Any]) -> str:
+@functools.lru_cache(maxsize=None)
+def load_json_cached(file_path: PathLike) -> Dict[str, Any]:
     """
-    Format evaluation results as a readable string.
+    Load a JSON file once per process.
+
+    The parsed object is shared between callers and must not be mutated.
 
     Args:
-        results: Evaluation results dictionary
+        file_path: Path to JSON file
 
     Returns:
-        Formatted string
+        Parsed JSON data
+    """
+    return load_json(file_path)
+
+
+def compute_cache_key(*parts: Any) -> str:
+    """
+    Compute a stable hash for a set of JSON-serializable values.
+
+    Used to key cached artifacts (e.g. compiled DSPy programs) on the inputs
+    that produced them, so a change to any part invalidates the cache.
+
+    Args:
+        *parts: Values to hash (model name, training data, config, ...)
+
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def iter_evaluation_results(results: Dict[str, Any]) -> Iterator[str]:
+    """
+    Yield the lines of format_evaluation_results, without newlines.
+
+    Args:
+        results: Evaluation results dictionary
+
+    Yields:
+        Formatted lines
     """
-    output = []
-    output.append("=" * 60)
-    output.append("EVALUATION RESULTS")
-    output.append("=" * 60)
-    output.append("")
+    yield "=" * 60
+    yield "EVALUATION RESULTS"
+    yield "=" * 60
+    yield ""
 
     if "average_precision" in results:
-        output.append(f"Average Precision:       {results['average_precision']:.2%}")
-        output.append(f"Average Recall:          {results['average_recall']:.2%}")
-        output.append(f"Average F1 Score:        {results['average_f1']:.2%}")
-        output.append(f"Average Critical Recall: {results['average_critical_recall']:.2%}")
-        output.append(f"Average Overall Score:   {results['average_overall']:.2%}")
-        output.append("")
+        yield f"Average Precision:       {results['average_precision']:.2%}"
+        yield f"Average Recall:          {results['average_recall']:.2%}"
+        yield f"Average F1 Score:        {results['average_f1']:.2%}"
+        yield f"Average Critical Recall: {results['average_critical_recall']:.2%}"
+        yield f"Average Overall Score:   {results['average_overall']:.2%}"
+        yield ""
 
     if "individual_results" in results:
-        output.append("Individual Test Results:")
-        output.append("-" * 60)
+        yield "Individual Test Results:"
+        yield "-" * 60
         for result in results["individual_results"]:
-            output.append(f"\nTest: {result['test_id']}")
-            output.append(f"  Precision: {result['precision']:.2%}")
-            output.append(f"  Recall:    {result['recall']:.2%}")
-            output.append(f"  F1 Score:  {result['f1_score']:.2%}")
-            output.append(f"  Critical Recall: {result['critical_recall']:.2%}")
-            output.append(f"  Overall:   {result['overall_score']:.2%}")
+            yield f"\nTest: {result['test_id']}"
+            yield f"  Precision: {result['precision']:.2%}"
+            yield f"  Recall:    {result['recall']:.2%}"
+            yield f"  F1 Score:  {result['f1_score']:.2%}"
+            yield f"  Critical Recall: {result['critical_recall']:.2%}"
+            yield f"  Overall:   {result['overall_score']:.2%}"
+
+    yield ""
+    yield "=" * 60
 
-    output.append("")
-    output.append("=" * 60)
 
-    return "\n".join(output)
+def format_evaluation_results(results: Dict[str, Any]) -> str:
+    """
+    Format evaluation results as a readable string.
+
+    Args:
+        results: Evaluation results dictionary
+
+    Returns:
+        Formatted string
+    """
+    return "\n".join(iter_evaluation_results(results))
+
+
+def _write_evaluation_results(f: TextIO, results: Dict[str, Any]):
+    """Write format_evaluation_results(results) to f line by line."""
+    lines = iter_evaluation_results(results)
+    f.write(next(lines))
+    for line in lines:
+        f.write("\n")
+        f.write(line)
 
 
 def create_comparison_report(
     baseline_results: Dict[str, Any],
     optimized_results: Dict[str, Any],
-    output_path: str
+    output_path: PathLike,
+    detailed: bool = False
 ):
     """
     Create a markdown comparison report.
 
+    The report is written to the file as it is produced.
+
     Args:
         baseline_results: Baseline evaluation results
         optimized_results: Optimized evaluation results
         output_path: Where to save the report
+        detailed: Also include the full per-test results for both runs
+            (otherwise only the summary and key improvements)
     """
-    report = []
-
-    report.append("# Skill Optimization Results\n")
-    report.append(f"Generated: {Path(output_path).stem}\n")
-
-    report.append("## Summary\n")
-    report.append("| Metric | Baseline | Optimized | Improvement |\n")
-    report.append("|--------|----------|-----------|-------------|\n")
+    output_path = Path(output_path)
+    _ensure_dir(output_path.parent)
 
     metrics = [
         ("Precision", "average_precision"),
@@ -121,41 +232,46 @@ def create_comparison_report(
         ("Overall Score", "average_overall")
     ]
 
+    # (name, baseline, optimized, improvement) per metric, shared by both sections
+    rows = []
     for metric_name, metric_key in metrics:
         baseline_val = baseline_results.get(metric_key, 0)
         optimized_val = optimized_results.get(metric_key, 0)
-        improvement = optimized_val - baseline_val
+        rows.append((metric_name, baseline_val, optimized_val, optimized_val - baseline_val))
+
+    with output_path.open("w") as f:
+        # Fixed text goes out as one fragment per block, not per line
+        f.write(
+            "# Skill Optimization Results\n"
+            f"Generated: {output_path.stem}\n"
+            "## Summary\n"
+            "| Metric | Baseline | Optimized | Improvement |\n"
+            "|--------|----------|-----------|-------------|\n"
+        )
 
-        report.append(
+        f.writelines(
             f"| {metric_name} | {baseline_val:.2%} | {optimized_val:.2%} | "
             f"{'+' if improvement >= 0 else ''}{improvement:.2%} |\n"
+            for metric_name, baseline_val, optimized_val, improvement in rows
         )
 
-    report.append("\n## Key Improvements\n")
+        f.write("\n## Key Improvements\n")
 
-    # Highlight significant improvements
-    for metric_name, metric_key in metrics:
-        baseline_val = baseline_results.get(metric_key, 0)
-        optimized_val = optimized_results.get(metric_key, 0)
-        improvement = optimized_val - baseline_val
-
-        if improvement >= 0.10:  # 10% improvement
-            report.append(f"- **{metric_name}** improved by {improvement:.1%}\n")
-
-    report.append("\n## Detailed Results\n")
-    report.append("### Baseline\n")
-    report.append("```\n")
-    report.append(format_evaluation_results(baseline_results))
-    report.append("```\n\n")
+        # Highlight significant improvements (10% or more)
+        f.writelines(
+            f"- **{metric_name}** improved by {improvement:.1%}\n"
+            for metric_name, _, _, improvement in rows
+            if improvement >= 0.10
+        )
 
-    report.append("### Optimized\n")
-    report.append("```\n")
-    report.append(format_evaluation_results(optimized_results))
-    report.append("```\n")
+        if not detailed:
+            return
 
-    # Save report
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    Path(output_path).write_text("".join(report))
+        f.write("\n## Detailed Results\n### Baseline\n```\n")
+        _write_evaluation_results(f, baseline_results)
+        f.write("```\n\n### Optimized\n```\n")
+        _write_evaluation_results(f, optimized_results)
+        f.write("```\n")
 
 
 def extract_issues_from_llm_output(output: str) -> List[Dict[str, Any]]:
@@ -170,26 +286,18 @@ def extract_issues_from_llm_output(output: str) -> List[Dict[str, Any]]:
     Returns:
         List of issue dictionaries
     """
-    import re
-
     issues = []
 
     # Look for patterns like "Issue #1:", "**Issue 1**:", etc.
-    issue_pattern = r'(?:Issue|Problem)\s*#?(\d+)[:\s]*([^\n]+)'
-
-    matches = re.finditer(issue_pattern, output, re.IGNORECASE | re.MULTILINE)
-
-    for match in matches:
+    for match in _ISSUE_RE.finditer(output):
         issue_num = match.group(1)
         issue_title = match.group(2).strip()
 
         # Try to find severity
         severity = "Medium"  # Default
-        severity_match = re.search(
-            r'Severity[:\s]*(Critical|High|Medium|Low)',
-            output[match.end():match.end()+200],
-            re.IGNORECASE
-        )
+        # Scan the 200 chars after the issue in place rather than slicing
+        end = match.end()
+        severity_match = _SEVERITY_RE.search(output, end, min(end + 200, len(output)))
         if severity_match:
             severity = severity_match.group(1).capitalize()
 
@@ -202,10 +310,19 @@ def extract_issues_from_llm_output(output: str) -> List[Dict[str, Any]]:
     return issues
 
 
+@functools.lru_cache(maxsize=None)
+def _bar_strings(length: int) -> tuple:
+    """Full and empty progress bars of a given length, built once."""
+    return '█' * length, '-' * length
+
+
 def print_progress_bar(iteration: int, total: int, prefix: str = '', suffix: str = '', length: int = 50):
     """
     Print a progress bar.
 
+    Redraws are skipped when the bar has not moved and the last one was
+    under 100 ms ago; the final iteration is always drawn.
+
     Args:
         iteration: Current iteration
         total: Total iterations
@@ -213,10 +330,22 @@ def print_progress_bar(iteration: int, total: int, prefix: str = '', suffix: str
         suffix: Suffix string
         length: Character length of bar
     """
-    percent = f"{100 * (iteration / float(total)):.1f}"
     filled_length = int(length * iteration // total)
-    bar = '█' * filled_length + '-' * (length - filled_length)
+    now = time.monotonic()
+    if (iteration != total and filled_length == print_progress_bar.last_filled
+            and now - print_progress_bar.last_emit < 0.1):
+        return
+    print_progress_bar.last_emit = now
+    print_progress_bar.last_filled = filled_length
+
+    percent = f"{100 * (iteration / float(total)):.1f}"
+    full, empty = _bar_strings(length)
+    bar = full[:filled_length] + empty[filled_length:]
     print(f'\r{prefix} |{bar}| {percent}% {suffix}', end='')
 
     if iteration == total:
         print()
+
+
+print_progress_bar.last_emit = 0.0
+print_progress_bar.last_filled = -1